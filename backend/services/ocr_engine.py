@@ -0,0 +1,338 @@
+"""
+OCR Engine Service
+
+Wraps the EasyOCR reader and, when exported ONNX models are available,
+runs the CRAFT detector and CRNN recognizer through ONNX Runtime instead
+of PyTorch eager mode. EasyOCR's own pre/post-processing is kept as-is.
+"""
+
+import inspect
+import logging
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Any, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+# Directory holding craft.onnx / crnn.onnx (see export_onnx_models)
+DEFAULT_MODEL_DIR = Path(
+    os.environ.get('OCR_ONNX_DIR', Path(__file__).resolve().parent.parent / 'models')
+)
+
+CRAFT_MODEL = 'craft.onnx'
+CRNN_MODEL = 'crnn.onnx'
+CRNN_INT8_MODEL = 'crnn.int8.onnx'
+
+# Fastest first; only the ones present in the installed onnxruntime build are used
+PREFERRED_PROVIDERS = [
+    'TensorrtExecutionProvider',
+    'CUDAExecutionProvider',
+    'CPUExecutionProvider',
+]
+
+
+class _OrtModule:
+    """Stand-in for a torch module that runs the forward pass in ONNX Runtime"""
+
+    def __init__(self, session):
+        self.session = session
+        self.input_names = [i.name for i in session.get_inputs()]
+
+    def eval(self):
+        return self
+
+    def _run(self, *tensors):
+        feed = {
+            name: tensor.detach().cpu().numpy()
+            for name, tensor in zip(self.input_names, tensors)
+        }
+        return self.session.run(None, feed)
+
+
+class _OrtDetector(_OrtModule):
+    """CRAFT detector: image batch -> (score maps, features)"""
+
+    def __call__(self, x):
+        import torch
+        y, feature = self._run(x)
+        return torch.from_numpy(y), torch.from_numpy(feature)
+
+
+class _OrtRecognizer(_OrtModule):
+    """CRNN recognizer: line crops -> per-step character logits"""
+
+    def __call__(self, image, text=None):
+        import torch
+        (preds,) = self._run(image, text)
+        return torch.from_numpy(preds)
+
+
+def fast_getDetBoxes_core(textmap, linkmap, text_threshold, link_threshold, low_text, estimate_num_chars=False):
+    """
+    Drop-in replacement for easyocr.craft_utils.getDetBoxes_core.
+
+    The upstream version allocates and scans a full-size segmentation map for
+    every connected component. Here all per-component work is restricted to
+    the component's (dilated) bounding box, which yields the same boxes.
+    """
+    import cv2
+    import numpy as np
+
+    img_h, img_w = textmap.shape
+
+    _, text_score = cv2.threshold(textmap, low_text, 1, 0)
+    _, link_score = cv2.threshold(linkmap, link_threshold, 1, 0)
+
+    text_score_comb = np.clip(text_score + link_score, 0, 1)
+    n_labels, labels, stats, _ = cv2.connectedComponentsWithStats(
+        text_score_comb.astype(np.uint8), connectivity=4
+    )
+    link_area = np.logical_and(link_score == 1, text_score == 0)
+
+    areas = stats[:, cv2.CC_STAT_AREA]
+    candidates = np.flatnonzero(areas >= 10)
+
+    det = []
+    mapper = []
+    for k in candidates[candidates > 0]:
+        x, y = stats[k, cv2.CC_STAT_LEFT], stats[k, cv2.CC_STAT_TOP]
+        w, h = stats[k, cv2.CC_STAT_WIDTH], stats[k, cv2.CC_STAT_HEIGHT]
+        size = areas[k]
+
+        # thresholding (only the component's bounding box can contain label k)
+        component = labels[y:y + h, x:x + w] == k
+        if textmap[y:y + h, x:x + w][component].max() < text_threshold:
+            continue
+
+        niter = int(math.sqrt(size * min(w, h) / (w * h)) * 2)
+        sx, ex = max(x - niter, 0), min(x + w + niter + 1, img_w)
+        sy, ey = max(y - niter, 0), min(y + h + niter + 1, img_h)
+
+        # make segmentation map for the padded box only
+        segmap = np.zeros((ey - sy, ex - sx), dtype=np.uint8)
+        segmap[y - sy:y - sy + h, x - sx:x - sx + w][component] = 255
+        if estimate_num_chars:
+            from scipy.ndimage import label
+            region = (textmap[sy:ey, sx:ex] - linkmap[sy:ey, sx:ex]) * segmap / 255.
+            _, character_locs = cv2.threshold(region, text_threshold, 1, 0)
+            _, n_chars = label(character_locs)
+            mapper.append(n_chars)
+        else:
+            mapper.append(k)
+        segmap[link_area[sy:ey, sx:ex]] = 0   # remove link area
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1 + niter, 1 + niter))
+        segmap = cv2.dilate(segmap, kernel)
+
+        # make box
+        ys, xs = np.nonzero(segmap)
+        np_contours = np.stack((xs + sx, ys + sy), axis=1)
+        rectangle = cv2.minAreaRect(np_contours)
+        box = cv2.boxPoints(rectangle)
+
+        # align diamond-shape
+        w, h = np.linalg.norm(box[0] - box[1]), np.linalg.norm(box[1] - box[2])
+        box_ratio = max(w, h) / (min(w, h) + 1e-5)
+        if abs(1 - box_ratio) <= 0.1:
+            l, r = np_contours[:, 0].min(), np_contours[:, 0].max()
+            t, b = np_contours[:, 1].min(), np_contours[:, 1].max()
+            box = np.array([[l, t], [r, t], [r, b], [l, b]], dtype=np.float32)
+
+        # make clock-wise order
+        startidx = box.sum(axis=1).argmin()
+        box = np.roll(box, 4 - startidx, 0)
+
+        det.append(box)
+
+    return det, labels, mapper
+
+
+def install_fast_postprocessing():
+    """Patch EasyOCR's CRAFT post-processing with fast_getDetBoxes_core"""
+    try:
+        from easyocr import craft_utils
+    except ImportError:
+        return
+    craft_utils.getDetBoxes_core = fast_getDetBoxes_core
+
+
+def _create_session(model_path: Path):
+    providers = [p for p in PREFERRED_PROVIDERS if p in ort.get_available_providers()]
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(str(model_path), sess_options=options, providers=providers)
+
+
+class OcrEngine:
+    """
+    Lazily constructed OCR engine.
+
+    Features:
+    - Single shared EasyOCR reader per process
+    - Thread-safe: the reader is built once and inference calls are serialized
+    - ONNX Runtime detector/recognizer when models are exported
+    - Falls back to EasyOCR's PyTorch models otherwise
+    """
+
+    def __init__(
+        self,
+        lang_list: Sequence[str] = ('en',),
+        model_dir: Path = DEFAULT_MODEL_DIR,
+        **reader_kwargs: Any
+    ):
+        """
+        Initialize the OCR engine (models are loaded on first use).
+
+        Args:
+            lang_list: EasyOCR language codes
+            model_dir: Directory containing the exported ONNX models
+            reader_kwargs: Extra keyword arguments for easyocr.Reader
+        """
+        self.lang_list = list(lang_list)
+        self.model_dir = Path(model_dir)
+        self.reader_kwargs = reader_kwargs
+        self.backend = 'pytorch'
+        self._reader = None
+        self._init_lock = threading.Lock()
+        # EasyOCR readers are not thread-safe; one inference at a time per reader
+        self._inference_lock = threading.Lock()
+
+    @property
+    def reader(self):
+        """The underlying easyocr.Reader, created on first access"""
+        if self._reader is None:
+            with self._init_lock:
+                # Double-checked so concurrent first calls build (and patch) one reader
+                if self._reader is None:
+                    import easyocr
+                    reader = easyocr.Reader(self.lang_list, **self.reader_kwargs)
+                    self._attach_onnx_models(reader)
+                    self._reader = reader
+                    logger.info(f"OCR engine ready ({self.backend} backend)")
+        return self._reader
+
+    def _attach_onnx_models(self, reader):
+        """Swap the reader's torch models for ONNX Runtime sessions if available"""
+        if not ONNX_AVAILABLE:
+            return
+
+        craft_path = self.model_dir / CRAFT_MODEL
+        crnn_path = self.model_dir / CRNN_INT8_MODEL
+        if not crnn_path.exists():
+            crnn_path = self.model_dir / CRNN_MODEL
+
+        try:
+            if craft_path.exists():
+                reader.detector = _OrtDetector(_create_session(craft_path))
+                self.backend = 'onnxruntime'
+            if crnn_path.exists():
+                reader.recognizer = _OrtRecognizer(_create_session(crnn_path))
+                self.backend = 'onnxruntime'
+        except Exception as e:
+            logger.warning(f"Failed to load ONNX OCR models, using PyTorch: {e}")
+
+    def readtext(self, image, **kwargs) -> List[tuple]:
+        """Detect and recognize text in a single image"""
+        reader = self.reader
+        with self._inference_lock:
+            return reader.readtext(image, **kwargs)
+
+
+def export_onnx_models(
+    model_dir: Path = DEFAULT_MODEL_DIR,
+    lang_list: Sequence[str] = ('en',),
+    quantize: bool = True,
+    opset_version: int = 17
+) -> Optional[Path]:
+    """
+    Export EasyOCR's CRAFT and CRNN models to ONNX.
+
+    Args:
+        model_dir: Output directory for the .onnx files
+        lang_list: EasyOCR language codes of the recognizer to export
+        quantize: Also write an int8 dynamically-quantized recognizer
+        opset_version: ONNX opset to target
+
+    Returns:
+        The output directory, or None if ONNX Runtime is not installed
+    """
+    if not ONNX_AVAILABLE:
+        logger.error("onnxruntime is not installed; cannot export OCR models")
+        return None
+
+    import torch
+    import easyocr
+
+    # Newer torch defaults to the dynamo exporter, which ignores dynamic_axes
+    export_kwargs = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs['dynamo'] = False
+
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+
+    # Torch dynamic quantization is not exportable, so load the float models
+    reader = easyocr.Reader(list(lang_list), gpu=False, quantize=False)
+    detector = getattr(reader.detector, 'module', reader.detector).eval()
+    recognizer = getattr(reader.recognizer, 'module', reader.recognizer).eval()
+
+    # AdaptiveAvgPool2d((None, 1)) has no ONNX lowering for a dynamic width;
+    # it only averages the trailing (height) axis, so express it as a mean
+    class _MeanLastAxis(torch.nn.Module):
+        def forward(self, x):
+            return x.mean(dim=3, keepdim=True)
+
+    recognizer.AdaptiveAvgPool = _MeanLastAxis()
+
+    torch.onnx.export(
+        detector,
+        torch.randn(1, 3, 640, 640),
+        str(model_dir / CRAFT_MODEL),
+        input_names=['image'],
+        output_names=['y', 'feature'],
+        dynamic_axes={
+            'image': {0: 'batch', 2: 'height', 3: 'width'},
+            'y': {0: 'batch', 1: 'map_height', 2: 'map_width'},
+            'feature': {0: 'batch', 2: 'map_height', 3: 'map_width'},
+        },
+        opset_version=opset_version,
+        **export_kwargs
+    )
+
+    torch.onnx.export(
+        recognizer,
+        (torch.randn(1, 1, 64, 256), torch.zeros(1, 1, dtype=torch.long)),
+        str(model_dir / CRNN_MODEL),
+        input_names=['image', 'text'],
+        output_names=['preds'],
+        dynamic_axes={
+            'image': {0: 'batch', 3: 'width'},
+            'text': {0: 'batch'},
+            'preds': {0: 'batch', 1: 'steps'},
+        },
+        opset_version=opset_version,
+        **export_kwargs
+    )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(
+            str(model_dir / CRNN_MODEL),
+            str(model_dir / CRNN_INT8_MODEL),
+            weight_type=QuantType.QInt8
+        )
+
+    logger.info(f"Exported OCR models to {model_dir}")
+    return model_dir
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    export_onnx_models()
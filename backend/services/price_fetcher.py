@@ -2,47 +2,221 @@
 Price Fetcher Service for Real-Time E-commerce Price Scraping
 
 This service provides infrastructure for fetching real prices from e-commerce platforms.
-Uses free web scraping with BeautifulSoup for real-time pricing.
+Uses free web scraping with selectolax for real-time pricing.
 """
 
 import asyncio
 import aiohttp
-import hashlib
+import heapq
 import logging
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Dict, Any, Sequence, Tuple
 import os
+import random
 import re
-from bs4 import BeautifulSoup
+from urllib.parse import quote_plus, urlsplit
+from selectolax.lexbor import LexborHTMLParser
 from fake_useragent import UserAgent
 
 logger = logging.getLogger(__name__)
 
+# aiohttp decodes br responses only when a Brotli binding is importable
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    try:
+        import brotlicffi
+        BROTLI_AVAILABLE = True
+    except ImportError:
+        BROTLI_AVAILABLE = False
+
+ACCEPT_ENCODING = 'br, gzip, deflate' if BROTLI_AVAILABLE else 'gzip, deflate'
+
 # Initialize user agent for realistic requests
 ua = UserAgent()
 
+# Desktop browser UAs, sampled once here so scrapes never go through fake_useragent
+_UA_BROWSERS = frozenset({'Chrome', 'Firefox', 'Edge'})
+_UA_POOL = tuple(
+    entry['useragent'] for entry in ua.data_browsers
+    if entry['type'] == 'desktop' and entry['browser'] in _UA_BROWSERS
+) or (ua.fallback,)
+
+# Concurrent scrapes allowed per platform host, across all user requests
+HOST_CONCURRENCY = 4
+
+# Backoff before each retry of a rate-limited (429) or failing (5xx) response
+RETRY_DELAYS = (0.2, 0.4, 0.8)
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Seconds a platform search that found no price is skipped (a broken selector or
+# blocked host would otherwise cost every request a full timeout)
+NEGATIVE_CACHE_TTL = 60
+
+# Search pages carry their first prices well within this; footers/reviews are skipped
+MAX_HTML_BYTES = 256 * 1024
+# Past the cap, up to this much more is read and discarded so the keep-alive
+# connection goes back to the pool; a longer remainder closes the connection instead
+MAX_DRAIN_BYTES = 256 * 1024
+
+# Worker processes for HTML parsing, so parse CPU never stalls the event loop
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Price text -> number ("₹1,299.00" -> "1,299.00"; commas are dropped before float())
+_PRICE_RE = re.compile(r'\d[\d,]*\.?\d*')
+
+# CSS selectors tried in order on each platform's search page
+AMAZON_PRICE_SELECTORS = ('.a-price-whole', '.a-price .a-offscreen', 'span.a-price-whole')
+FLIPKART_PRICE_SELECTORS = ('._30jeq3', '._1_WHN1', r'.\_25b18c')
+MEESHO_PRICE_SELECTORS = ('.ProductCard__Price', '[data-testid="product-price"]', '.sc-eDvSVe')
+BIGBASKET_PRICE_SELECTORS = ('.Pricing___StyledLabel', '.price', '[data-testid="product-price"]')
+JIOMART_PRICE_SELECTORS = ('.jm-heading-xxs', '.final-price', '[data-testid="price"]')
+BLINKIT_PRICE_SELECTORS = ('.Product__UpdatedPrice', '.price', '[data-testid="product-price"]')
+ZEPTO_PRICE_SELECTORS = ('.price-text', '[data-testid="product-price"]', '.product-price')
+SWIGGY_INSTAMART_PRICE_SELECTORS = ('.ProductCard_price', '[data-testid="product-price"]', '.price-value')
+DUNZO_PRICE_SELECTORS = ('.product-price', '[data-testid="price"]', '.price-text')
+
+# (platform name, search URL prefix, price selectors); the quote_plus'd query is appended
+PLATFORMS = (
+    ('Amazon', 'https://www.amazon.in/s?k=', AMAZON_PRICE_SELECTORS),
+    ('Flipkart', 'https://www.flipkart.com/search?q=', FLIPKART_PRICE_SELECTORS),
+    ('Meesho', 'https://www.meesho.com/search?q=', MEESHO_PRICE_SELECTORS),
+    ('BigBasket', 'https://www.bigbasket.com/ps/?q=', BIGBASKET_PRICE_SELECTORS),
+    ('JioMart', 'https://www.jiomart.com/search/', JIOMART_PRICE_SELECTORS),
+    ('Blinkit', 'https://blinkit.com/s/?q=', BLINKIT_PRICE_SELECTORS),
+    ('Zepto', 'https://www.zepto.com/search?query=', ZEPTO_PRICE_SELECTORS),
+    ('Swiggy Instamart', 'https://www.swiggy.com/instamart/search?custom_back=true&query=', SWIGGY_INSTAMART_PRICE_SELECTORS),
+    ('Dunzo', 'https://www.dunzo.com/search/', DUNZO_PRICE_SELECTORS),
+)
+
+# Origins connected to at startup so the first scrape of each reuses a warm socket
+WARM_ORIGINS = tuple(dict.fromkeys(
+    '{0.scheme}://{0.netloc}/'.format(urlsplit(search_url)) for _, search_url, _ in PLATFORMS
+))
+WARM_TIMEOUT = aiohttp.ClientTimeout(total=2)
+
+def _parse_price(html: str, price_selectors: Sequence[str]) -> Optional[float]:
+    """Return the first price matched by price_selectors (runs in a parse worker)"""
+    tree = LexborHTMLParser(html)  # C (lexbor) parser, much faster than bs4
+    
+    # Try each selector
+    for selector in price_selectors:
+        for node in tree.css(selector):
+            text = node.text(strip=True)
+            # Extract price using regex
+            price_match = _PRICE_RE.search(text)
+            if price_match:
+                price_str = price_match.group().replace(',', '')
+                try:
+                    return float(price_str)
+                except ValueError:
+                    continue
+    
+    return None
+
 class PriceFetcher:
     """
     Fetch prices from e-commerce platforms.
     
     Features:
-    - In-memory caching with TTL
-    - Async parallel fetching
+    - In-memory LRU caching with TTL
+    - Optional Mongo TTL collection shared by all workers
+    - Async parallel fetching over one pooled HTTP session
     - Graceful fallback to mock data
     - Ready for API integration
     """
     
-    def __init__(self, cache_ttl: int = 3600):
+    def __init__(self, cache_ttl: int = 3600, max_items: int = 10000):
         """
         Initialize price fetcher.
         
         Args:
             cache_ttl: Cache time-to-live in seconds (default: 1 hour)
+            max_items: Cached products kept before least-recently-used eviction
         """
-        self.cache: Dict[str, tuple] = {}
+        # key -> (prices, monotonic expiry); order is least -> most recently used
+        self.cache: OrderedDict[str, Tuple[List[Dict], float]] = OrderedDict()
         self.cache_ttl = cache_ttl
+        self.max_items = max_items
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        # search URL -> monotonic time until which it is not scraped again
+        self._failed: Dict[str, float] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+        self._prewarm_task: Optional[asyncio.Task] = None
+        self._host_sems: Dict[str, asyncio.Semaphore] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Motor collection with a TTL index on expires_at (see start())
+        self.shared_cache = None
         logger.info(f"PriceFetcher initialized with {cache_ttl}s cache TTL")
     
+    async def start(self, shared_cache=None, prewarm: bool = False) -> aiohttp.ClientSession:
+        """
+        Open the shared HTTP session (idempotent).
+        
+        Connections, DNS lookups and TLS sessions are reused across scrapes
+        instead of being set up again for every platform on every product.
+        
+        Args:
+            shared_cache: Optional Motor collection used as a second cache
+                tier, so every worker process reuses the others' scrapes
+            prewarm: Open keep-alive connections to every platform in the
+                background (DNS, TCP and TLS done before the first user request)
+        """
+        if shared_cache is not None:
+            self.shared_cache = shared_cache
+        if self._parse_pool is None:
+            # spawn: forking the server would copy its OCR threads and model memory
+            self._parse_pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=8,
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=5)  # 5 second timeout
+            )
+            if prewarm:
+                self._prewarm_task = asyncio.create_task(self._prewarm(self._session))
+        return self._session
+    
+    async def _prewarm(self, session: aiohttp.ClientSession):
+        """HEAD each platform origin; the connections stay pooled for later scrapes"""
+        async def warm(origin: str):
+            async with session.head(origin, allow_redirects=False, timeout=WARM_TIMEOUT):
+                pass
+        
+        results = await asyncio.gather(*(warm(origin) for origin in WARM_ORIGINS), return_exceptions=True)
+        warmed = sum(not isinstance(result, Exception) for result in results)
+        logger.info(f"Pre-warmed connections to {warmed}/{len(WARM_ORIGINS)} platforms")
+    
+    async def close(self):
+        """Close the shared HTTP session and parse workers"""
+        if self._prewarm_task is not None:
+            self._prewarm_task.cancel()
+            self._prewarm_task = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(wait=False, cancel_futures=True)
+        self._parse_pool = None
+    
     async def get_prices(
         self, 
         product_name: str, 
@@ -69,6 +243,12 @@ class PriceFetcher:
             logger.info(f"Cache hit for {product_name}")
             return cached
         
+        cached = await self._get_from_shared_cache(cache_key)
+        if cached:
+            logger.info(f"Shared cache hit for {product_name}")
+            self._save_to_cache(cache_key, cached)
+            return cached
+        
         logger.info(f"Cache miss for {product_name}, fetching prices...")
         
         # Fetch from platforms in parallel
@@ -76,6 +256,7 @@ class PriceFetcher:
         
         # Cache results
         self._save_to_cache(cache_key, prices)
+        await self._save_to_shared_cache(cache_key, prices)
         
         return prices
     
@@ -91,18 +272,9 @@ class PriceFetcher:
         Currently returns mock data. Ready for API integration.
         """
         
-        # Create tasks for parallel fetching
-        tasks = [
-            self._fetch_amazon(product, quantity),
-            self._fetch_flipkart(product, quantity),
-            self._fetch_meesho(product, quantity),
-            self._fetch_bigbasket(product, quantity),
-            self._fetch_jiomart(product, quantity),
-            self._fetch_blinkit(product, quantity),
-            self._fetch_zepto(product, quantity),
-            self._fetch_swiggy_instamart(product, quantity),
-            self._fetch_dunzo(product, quantity),
-        ]
+        # Create tasks for parallel fetching (quote_plus also escapes &, # and non-ASCII)
+        search_query = quote_plus(f"{product} {quantity}")
+        tasks = [self._fetch_platform(platform, search_query) for platform in PLATFORMS]
         
         # Execute in parallel
         results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -119,305 +291,153 @@ class PriceFetcher:
     
     # Platform-specific fetch methods using web scraping
     
-    async def _scrape_price(self, url: str, price_selectors: List[str]) -> Optional[float]:
+    async def _fetch_html(self, url: str, headers: Dict[str, str]) -> Optional[str]:
+        """
+        GET a page through the shared session.
+        
+        At most HOST_CONCURRENCY requests run per host; 429/5xx responses are
+        retried after RETRY_DELAYS (the host slot is held while backing off).
+        
+        Returns:
+            Page HTML (at most MAX_HTML_BYTES), or None for any other non-200 response
+        """
+        host = urlsplit(url).netloc
+        semaphore = self._host_sems.get(host)
+        if semaphore is None:
+            semaphore = self._host_sems[host] = asyncio.Semaphore(HOST_CONCURRENCY)
+        
+        session = await self.start()
+        async with semaphore:
+            for delay in (*RETRY_DELAYS, None):
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 200:
+                        return await self._read_html(response)
+                    if response.status not in RETRY_STATUSES or delay is None:
+                        return None
+                logger.debug(f"{host} returned {response.status}, retrying in {delay}s")
+                await asyncio.sleep(delay)
+    
+    @staticmethod
+    async def _read_html(response: aiohttp.ClientResponse) -> str:
+        """Read the (decompressed) body up to MAX_HTML_BYTES and decode it"""
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= MAX_HTML_BYTES:
+                break
+        
+        # An unread body would make release() drop the connection; drain a short
+        # remainder to keep it pooled, and close outright when the page is much larger
+        drained = 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            drained += len(chunk)
+            if drained > MAX_DRAIN_BYTES:
+                response.close()
+                break
+        
+        raw = b''.join(chunks)[:MAX_HTML_BYTES]
+        return raw.decode(response.charset or 'utf-8', errors='replace')
+    
+    async def _scrape_price(self, url: str, price_selectors: Sequence[str]) -> Optional[float]:
+        """
+        Scrape a price, coalescing concurrent requests for the same URL.
+        
+        The first caller performs the GET and parse; callers arriving while it
+        is in flight await its result instead of issuing a duplicate request.
+        """
+        inflight = self._inflight.get(url)
+        if inflight is not None:
+            # shield: a cancelled follower must not cancel the shared scrape
+            return await asyncio.shield(inflight)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        try:
+            price = await self._scrape_price_once(url, price_selectors)
+            future.set_result(price)
+            return price
+        finally:
+            del self._inflight[url]
+            if not future.done():
+                # Leader was cancelled; waiting followers just get no price
+                future.set_result(None)
+    
+    async def _scrape_price_once(self, url: str, price_selectors: Sequence[str]) -> Optional[float]:
         """
         Generic scraper to extract price from a webpage.
         
         Args:
             url: URL to scrape
-            price_selectors: List of CSS selectors to try for price extraction
+            price_selectors: CSS selectors to try for price extraction
         
         Returns:
             Extracted price or None
         """
         try:
             headers = {
-                'User-Agent': ua.random,
+                'User-Agent': random.choice(_UA_POOL),
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
                 'Accept-Language': 'en-US,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate',
+                'Accept-Encoding': ACCEPT_ENCODING,
                 'Connection': 'keep-alive',
             }
             
-            timeout = aiohttp.ClientTimeout(total=5)  # 5 second timeout
-            
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url, headers=headers) as response:
-                    if response.status != 200:
-                        return None
-                    
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')  # Use built-in parser
-                    
-                    # Try each selector
-                    for selector in price_selectors:
-                        elements = soup.select(selector)
-                        for element in elements:
-                            text = element.get_text(strip=True)
-                            # Extract price using regex
-                            price_match = re.search(r'[\d,]+\.?\d*', text.replace(',', ''))
-                            if price_match:
-                                price_str = price_match.group()
-                                try:
-                                    return float(price_str)
-                                except ValueError:
-                                    continue
+            html = await self._fetch_html(url, headers)
+            if html is None:
+                return None
             
-            return None
+            return await asyncio.get_running_loop().run_in_executor(
+                self._parse_pool, _parse_price, html, tuple(price_selectors)
+            )
             
         except Exception as e:
             logger.debug(f"Scraping error for {url}: {e}")
             return None
     
-    async def _fetch_amazon(self, product: str, qty: str) -> Optional[Dict]:
-        """Fetch from Amazon India using web scraping"""
-        try:
-            search_query = f"{product} {qty}".replace(' ', '+')
-            url = f"https://www.amazon.in/s?k={search_query}"
-            
-            price_selectors = [
-                '.a-price-whole',
-                '.a-price .a-offscreen',
-                'span.a-price-whole'
-            ]
-            
-            price = await self._scrape_price(url, price_selectors)
-            
-            if price:
-                return {
-                    'platform': 'Amazon',
-                    'price': price,
-                    'url': url,
-                    'scraped': True
-                }
-            
-        except Exception as e:
-            logger.debug(f"Amazon scrape error: {e}")
-        
-        return None
-    
-    async def _fetch_flipkart(self, product: str, qty: str) -> Optional[Dict]:
-        """Fetch from Flipkart using web scraping"""
-        try:
-            search_query = f"{product} {qty}".replace(' ', '+')
-            url = f"https://www.flipkart.com/search?q={search_query}"
-            
-            price_selectors = [
-                '._30jeq3',
-                '._1_WHN1',
-                '.\_25b18c'
-            ]
-            
-            price = await self._scrape_price(url, price_selectors)
-            
-            if price:
-                return {
-                    'platform': 'Flipkart',
-                    'price': price,
-                    'url': url,
-                    'scraped': True
-                }
-            
-        except Exception as e:
-            logger.debug(f"Flipkart scrape error: {e}")
-        
-        return None
-    
-    async def _fetch_meesho(self, product: str, qty: str) -> Optional[Dict]:
-        """Fetch from Meesho using web scraping"""
-        try:
-            search_query = f"{product} {qty}".replace(' ', '+')
-            url = f"https://www.meesho.com/search?q={search_query}"
-            
-            price_selectors = [
-                '.ProductCard__Price',
-                '[data-testid="product-price"]',
-                '.sc-eDvSVe'
-            ]
-            
-            price = await self._scrape_price(url, price_selectors)
-            
-            if price:
-                return {
-                    'platform': 'Meesho',
-                    'price': price,
-                    'url': url,
-                    'scraped': True
-                }
-            
-        except Exception as e:
-            logger.debug(f"Meesho scrape error: {e}")
-        
-        return None
-    
-    async def _fetch_bigbasket(self, product: str, qty: str) -> Optional[Dict]:
-        """Fetch from BigBasket using web scraping"""
-        try:
-            search_query = f"{product} {qty}".replace(' ', '+')
-            url = f"https://www.bigbasket.com/ps/?q={search_query}"
-            
-            price_selectors = [
-                '.Pricing___StyledLabel',
-                '.price',
-                '[data-testid="product-price"]'
-            ]
-            
-            price = await self._scrape_price(url, price_selectors)
-            
-            if price:
-                return {
-                    'platform': 'BigBasket',
-                    'price': price,
-                    'url': url,
-                    'scraped': True
-                }
-            
-        except Exception as e:
-            logger.debug(f"BigBasket scrape error: {e}")
-        
-        return None
-    
-    async def _fetch_jiomart(self, product: str, qty: str) -> Optional[Dict]:
-        """Fetch from JioMart using web scraping"""
-        try:
-            search_query = f"{product} {qty}".replace(' ', '+')
-            url = f"https://www.jiomart.com/search/{search_query}"
-            
-            price_selectors = [
-                '.jm-heading-xxs',
-                '.final-price',
-                '[data-testid="price"]'
-            ]
-            
-            price = await self._scrape_price(url, price_selectors)
-            
-            if price:
-                return {
-                    'platform': 'JioMart',
-                    'price': price,
-                    'url': url,
-                    'scraped': True
-                }
-            
-        except Exception as e:
-            logger.debug(f"JioMart scrape error: {e}")
-        
-        return None
-    
-    async def _fetch_blinkit(self, product: str, qty: str) -> Optional[Dict]:
-        """Fetch from Blinkit using web scraping"""
-        try:
-            search_query = f"{product} {qty}".replace(' ', '+')
-            url = f"https://blinkit.com/s/?q={search_query}"
-            
-            price_selectors = [
-                '.Product__UpdatedPrice',
-                '.price',
-                '[data-testid="product-price"]'
-            ]
-            
-            price = await self._scrape_price(url, price_selectors)
-            
-            if price:
-                return {
-                    'platform': 'Blinkit',
-                    'price': price,
-                    'url': url,
-                    'scraped': True
-                }
-            
-        except Exception as e:
-            logger.debug(f"Blinkit scrape error: {e}")
-        
-        return None
-    
-    async def _fetch_zepto(self, product: str, qty: str) -> Optional[Dict]:
-        """Fetch from Zepto using web scraping"""
-        try:
-            search_query = f"{product} {qty}".replace(' ', '+')
-            url = f"https://www.zepto.com/search?query={search_query}"
-            
-            price_selectors = [
-                '.price-text',
-                '[data-testid="product-price"]',
-                '.product-price'
-            ]
-            
-            price = await self._scrape_price(url, price_selectors)
-            
-            if price:
-                return {
-                    'platform': 'Zepto',
-                    'price': price,
-                    'url': url,
-                    'scraped': True
-                }
-            
-        except Exception as e:
-            logger.debug(f"Zepto scrape error: {e}")
+    async def _fetch_platform(
+        self,
+        platform: Tuple[str, str, Sequence[str]],
+        search_query: str
+    ) -> Optional[Dict]:
+        """Scrape one platform's search page for the URL-encoded search query"""
+        name, search_url, price_selectors = platform
+        url = search_url + search_query
+        now = time.monotonic()
+        if self._failed.get(url, 0.0) > now:
+            return None
         
-        return None
-    
-    async def _fetch_swiggy_instamart(self, product: str, qty: str) -> Optional[Dict]:
-        """Fetch from Swiggy Instamart using web scraping"""
         try:
-            search_query = f"{product} {qty}".replace(' ', '+')
-            url = f"https://www.swiggy.com/instamart/search?custom_back=true&query={search_query}"
-            
-            price_selectors = [
-                '.ProductCard_price',
-                '[data-testid="product-price"]',
-                '.price-value'
-            ]
-            
             price = await self._scrape_price(url, price_selectors)
             
             if price:
                 return {
-                    'platform': 'Swiggy Instamart',
+                    'platform': name,
                     'price': price,
                     'url': url,
                     'scraped': True
                 }
             
         except Exception as e:
-            logger.debug(f"Swiggy Instamart scrape error: {e}")
+            logger.debug(f"{name} scrape error: {e}")
         
+        self._remember_failure(url, now)
         return None
     
-    async def _fetch_dunzo(self, product: str, qty: str) -> Optional[Dict]:
-        """Fetch from Dunzo using web scraping"""
-        try:
-            search_query = f"{product} {qty}".replace(' ', '+')
-            url = f"https://www.dunzo.com/search/{search_query}"
-            
-            price_selectors = [
-                '.product-price',
-                '[data-testid="price"]',
-                '.price-text'
-            ]
-            
-            price = await self._scrape_price(url, price_selectors)
-            
-            if price:
-                return {
-                    'platform': 'Dunzo',
-                    'price': price,
-                    'url': url,
-                    'scraped': True
-                }
-            
-        except Exception as e:
-            logger.debug(f"Dunzo scrape error: {e}")
-        
-        return None
+    def _remember_failure(self, url: str, now: float):
+        """Skip this search URL for NEGATIVE_CACHE_TTL seconds"""
+        if len(self._failed) >= self.max_items:
+            self._failed = {u: until for u, until in self._failed.items() if until > now}
+            if len(self._failed) >= self.max_items:
+                self._failed.clear()
+        self._failed[url] = now + NEGATIVE_CACHE_TTL
     
     # Cache management methods
     
     def _get_cache_key(self, product: str, quantity: str) -> str:
-        """Generate cache key from product name and quantity"""
-        key_string = f"{product.lower().strip()}:{quantity}"
-        return hashlib.md5(key_string.encode()).hexdigest()
+        """Generate cache key from product name and quantity (also the shared cache _id)"""
+        return f"{product.lower().strip()}:{quantity}"
     
     def _get_from_cache(self, key: str) -> Optional[List[Dict]]:
         """
@@ -426,44 +446,92 @@ class PriceFetcher:
         Returns:
             Cached prices or None if expired/missing
         """
-        if key in self.cache:
-            data, timestamp = self.cache[key]
-            age = (datetime.now() - timestamp).total_seconds()
-            
-            if age < self.cache_ttl:
-                logger.debug(f"Cache hit (age: {age:.0f}s)")
+        entry = self.cache.get(key)
+        if entry is not None:
+            data, expires_at = entry
+            if expires_at > time.monotonic():
+                self.cache.move_to_end(key)
+                self._hits += 1
                 return data
-            else:
-                logger.debug(f"Cache expired (age: {age:.0f}s)")
-                del self.cache[key]
+            
+            logger.debug("Cache expired")
+            del self.cache[key]
+            self._expirations += 1
         
+        self._misses += 1
         return None
     
     def _save_to_cache(self, key: str, data: List[Dict]):
-        """Save prices to cache with timestamp"""
-        self.cache[key] = (data, datetime.now())
+        """Save prices to cache, evicting expired and then least-recently-used entries"""
+        now = time.monotonic()
+        expires_at = now + self.cache_ttl
+        self.cache[key] = (data, expires_at)
+        self.cache.move_to_end(key)
+        heapq.heappush(self._expiry_heap, (expires_at, key))
+        
+        self._purge_expired(now)
+        while len(self.cache) > self.max_items:
+            self.cache.popitem(last=False)
+            self._evictions += 1
         logger.debug(f"Cached {len(data)} prices")
     
+    def _purge_expired(self, now: float):
+        """Drop entries whose expiry has passed (O(log N) per expired entry)"""
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            entry = self.cache.get(key)
+            # Skip heap records superseded by a re-save or already evicted
+            if entry is not None and entry[1] == expires_at:
+                del self.cache[key]
+                self._expirations += 1
+    
+    async def _get_from_shared_cache(self, key: str) -> Optional[List[Dict]]:
+        """Get prices cached by any worker; the TTL monitor only runs every 60s, so expiry is checked here too"""
+        if self.shared_cache is None:
+            return None
+        try:
+            doc = await self.shared_cache.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                {"_id": 0, "data": 1}
+            )
+        except Exception as e:
+            logger.warning(f"Shared price cache read failed: {e}")
+            return None
+        return doc["data"] if doc else None
+    
+    async def _save_to_shared_cache(self, key: str, data: List[Dict]):
+        """Save prices to the shared cache; Mongo drops the document after cache_ttl"""
+        if self.shared_cache is None:
+            return
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.cache_ttl)
+        try:
+            await self.shared_cache.replace_one(
+                {"_id": key},
+                {"data": data, "expires_at": expires_at},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Shared price cache write failed: {e}")
+    
     def clear_cache(self):
         """Clear all cached prices"""
         self.cache.clear()
+        self._expiry_heap.clear()
+        self._failed.clear()
         logger.info("Price cache cleared")
     
     def get_cache_stats(self) -> Dict[str, Any]:
-        """Get cache statistics"""
-        total_items = len(self.cache)
-        expired_items = 0
-        
-        for key, (data, timestamp) in self.cache.items():
-            age = (datetime.now() - timestamp).total_seconds()
-            if age >= self.cache_ttl:
-                expired_items += 1
-        
+        """Get cache statistics (expired entries are purged first)"""
+        self._purge_expired(time.monotonic())
         return {
-            "total_items": total_items,
-            "active_items": total_items - expired_items,
-            "expired_items": expired_items,
-            "cache_ttl": self.cache_ttl
+            "total_items": len(self.cache),
+            "max_items": self.max_items,
+            "cache_ttl": self.cache_ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "expirations": self._expirations
         }
 
 
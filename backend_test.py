@@ -1,66 +1,217 @@
-import requests
+import httpx
+import orjson
 import sys
 import json
+import base64
+import functools
+import io
+import logging
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import time
 import os
 from datetime import datetime
 from pathlib import Path
 
+# HTTP/2 lets the concurrent tests share one TLS connection (needs the h2 package)
+try:
+    import h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_BASE_URL = "https://pricepal-30.preview.emergentagent.com/api"
+# Rate limits, server errors and timeouts from the preview environment are retried
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Methods that are safe to repeat after a request may already have been processed
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+# POST/PATCH are only retried when the server cannot have acted on the request:
+# it was rejected before processing, or the connection was never established
+UNSAFE_RETRY_STATUSES = frozenset({429, 503})
+UNSAFE_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+MAX_RETRIES = 4
+BACKOFF_FACTOR = 0.5
+# Concurrent tests in flight at once; keeps the shared preview backend from being flooded
+MAX_CONCURRENT_TESTS = 4
+JSON_HEADERS = {'Content-Type': 'application/json'}
+# bills/upload runs OCR, price lookups and LLM categorization before it answers
+UPLOAD_TIMEOUT = httpx.Timeout(120.0, connect=5.0)
+# TCP keepalive stops idle pooled connections being silently dropped by the preview edge
+# (httpcore already sets TCP_NODELAY on every connection, so small POSTs are not delayed)
+SOCKET_OPTIONS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+# JWTs from earlier runs, per base URL, so reruns skip the bcrypt-bound register/login calls
+TOKEN_CACHE_PATH = Path.home() / '.cache' / 'smartspend_test_token.json'
+
+logger = logging.getLogger('smartspend')
+
+def token_expiry(token):
+    """The JWT's exp claim (unverified; only used to skip tokens that are surely expired)"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload)).get('exp', 0)
+    except (IndexError, ValueError):
+        return 0
+
+def read_token_cache():
+    try:
+        with open(TOKEN_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+@functools.lru_cache(maxsize=1)
+def sample_bill_png():
+    """PNG bytes of a blank 400x600 test bill (encoded once per process)"""
+    from PIL import Image
+    
+    img = Image.new('RGB', (400, 600), color='white')
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format='PNG')
+    return img_bytes.getvalue()
+
 class SmartSpendAPITester:
-    def __init__(self):
-        self.base_url = "https://pricepal-30.preview.emergentagent.com/api"
+    def __init__(self, base_url=DEFAULT_BASE_URL):
+        self.base_url = base_url
         self.token = None
         self.user_id = None
         self.tests_run = 0
         self.tests_passed = 0
         self.test_results = []
+        self._results_lock = threading.Lock()
+        # Per-thread line buffer, so a concurrent test's output is emitted as one block
+        self._output = threading.local()
+        
+        # One client for every test: a single (HTTP/2 multiplexed) connection instead of a
+        # TLS handshake per request (retries are handled by send())
+        limits = httpx.Limits(max_connections=10, max_keepalive_connections=10)
+        self.client = httpx.Client(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            transport=httpx.HTTPTransport(
+                http2=HTTP2_AVAILABLE,
+                limits=limits,
+                socket_options=SOCKET_OPTIONS
+            )
+        )
+
+    def set_token(self, token):
+        """Remember the auth token and send it on every following request"""
+        self.token = token
+        self.client.headers['Authorization'] = f'Bearer {token}'
+
+    def load_cached_token(self):
+        """Reuse a cached token for this base URL if it is unexpired and /auth/me accepts it"""
+        cached = read_token_cache().get(self.base_url)
+        if not cached or token_expiry(cached['token']) <= time.time() + 60:
+            return False
+        
+        self.set_token(cached['token'])
+        try:
+            if self.send('GET', 'auth/me').status_code == 200:
+                self.user_id = cached['user_id']
+                self.say(f"   Using cached token for user {self.user_id}")
+                return True
+        except httpx.HTTPError:
+            pass
+        
+        self.token = None
+        del self.client.headers['Authorization']
+        return False
+
+    def save_token(self):
+        """Write the current token to the cache (atomically, keeping other base URLs)"""
+        cache = read_token_cache()
+        cache[self.base_url] = {
+            "token": self.token,
+            "user_id": self.user_id,
+            "exp": token_expiry(self.token)
+        }
+        try:
+            TOKEN_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = TOKEN_CACHE_PATH.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, TOKEN_CACHE_PATH)
+        except OSError as e:
+            self.say(f"   Could not cache token: {e}")
+
+    def send(self, method, endpoint, data=None, files=None, timeout=httpx.USE_CLIENT_DEFAULT):
+        """Send a request, retrying flaky responses and timeouts with exponential backoff"""
+        # A slow POST may already have been applied, so it is never sent twice
+        if method in IDEMPOTENT_METHODS:
+            retry_statuses, retry_errors = RETRY_STATUSES, httpx.TransportError
+        else:
+            retry_statuses, retry_errors = UNSAFE_RETRY_STATUSES, UNSAFE_RETRY_ERRORS
+        # orjson-encoded once, reused by every retry
+        body = None if data is None else orjson.dumps(data)
+        headers = None if body is None else JSON_HEADERS
+        for attempt in range(MAX_RETRIES + 1):
+            delay = BACKOFF_FACTOR * 2 ** attempt
+            try:
+                response = self.client.request(
+                    method, endpoint, content=body, files=files, headers=headers, timeout=timeout
+                )
+            except retry_errors:
+                if attempt == MAX_RETRIES:
+                    raise
+            else:
+                if response.status_code not in retry_statuses or attempt == MAX_RETRIES:
+                    return response
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+            time.sleep(delay)
+
+    def say(self, message):
+        """Log a line of test output (buffered while the test runs concurrently)"""
+        lines = getattr(self._output, 'lines', None)
+        if lines is None:
+            logger.info(message)
+        else:
+            lines.append(message)
+
+    def run_buffered(self, test):
+        """Run a test, logging its output in a single record when it finishes"""
+        self._output.lines = []
+        try:
+            return test()
+        finally:
+            logger.info("\n".join(self._output.lines))
+            self._output.lines = None
 
     def log_test(self, name, success, details=""):
         """Log test result"""
-        self.tests_run += 1
-        if success:
-            self.tests_passed += 1
-            print(f"✅ {name} - PASSED")
-        else:
-            print(f"❌ {name} - FAILED: {details}")
-        
-        self.test_results.append({
-            "test": name,
-            "success": success,
-            "details": details
-        })
+        with self._results_lock:
+            self.tests_run += 1
+            if success:
+                self.tests_passed += 1
+                self.say(f"✅ {name} - PASSED")
+            else:
+                self.say(f"❌ {name} - FAILED: {details}")
+            
+            self.test_results.append({
+                "test": name,
+                "success": success,
+                "details": details
+            })
 
-    def run_test(self, name, method, endpoint, expected_status, data=None, files=None):
+    def run_test(self, name, method, endpoint, expected_status, data=None, files=None,
+                 timeout=httpx.USE_CLIENT_DEFAULT):
         """Run a single API test"""
-        url = f"{self.base_url}/{endpoint}"
-        headers = {'Content-Type': 'application/json'}
-        if self.token:
-            headers['Authorization'] = f'Bearer {self.token}'
-        
-        if files:
-            # Remove Content-Type for file uploads
-            headers.pop('Content-Type', None)
-
-        print(f"\n🔍 Testing {name}...")
-        print(f"   URL: {url}")
+        self.say(f"\n🔍 Testing {name}...")
+        self.say(f"   URL: {self.base_url}/{endpoint}")
         
         try:
-            if method == 'GET':
-                response = requests.get(url, headers=headers)
-            elif method == 'POST':
-                if files:
-                    response = requests.post(url, files=files, headers=headers)
-                else:
-                    response = requests.post(url, json=data, headers=headers)
-            elif method == 'PUT':
-                response = requests.put(url, json=data, headers=headers)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=headers)
+            # JSON bodies are sent with their Content-Type; httpx sets the multipart one
+            response = self.send(method, endpoint, data=data, files=files, timeout=timeout)
 
             success = response.status_code == expected_status
             
             if success:
                 try:
-                    response_data = response.json()
+                    response_data = orjson.loads(response.content)
                     self.log_test(name, True, f"Status: {response.status_code}")
                     return True, response_data
                 except:
@@ -68,12 +219,16 @@ class SmartSpendAPITester:
                     return True, {}
             else:
                 try:
-                    error_data = response.json()
+                    error_data = orjson.loads(response.content)
                     self.log_test(name, False, f"Expected {expected_status}, got {response.status_code}: {error_data}")
                 except:
                     self.log_test(name, False, f"Expected {expected_status}, got {response.status_code}: {response.text}")
                 return False, {}
 
+        except httpx.TransportError as e:
+            # Still failing after any retries; record it and let the remaining tests run
+            self.log_test(name, False, f"Network error: {e!r}")
+            return False, {}
         except Exception as e:
             self.log_test(name, False, f"Exception: {str(e)}")
             return False, {}
@@ -95,10 +250,10 @@ class SmartSpendAPITester:
         )
         
         if success and 'token' in response:
-            self.token = response['token']
+            self.set_token(response['token'])
             self.user_id = response['user']['id']
-            print(f"   Token: {self.token[:20]}...")
-            print(f"   User ID: {self.user_id}")
+            self.say(f"   Token: {self.token[:20]}...")
+            self.say(f"   User ID: {self.user_id}")
             return True
         return False
 
@@ -119,7 +274,7 @@ class SmartSpendAPITester:
         )
         
         if success and 'token' in response:
-            self.token = response['token']
+            self.set_token(response['token'])
             self.user_id = response['user']['id']
             return True
         return False
@@ -136,32 +291,23 @@ class SmartSpendAPITester:
 
     def test_bill_upload(self):
         """Test bill upload with a sample image"""
-        # Create a simple test image file
         try:
-            from PIL import Image
-            import io
-            
-            # Create a simple test image with some text-like content
-            img = Image.new('RGB', (400, 600), color='white')
-            img_bytes = io.BytesIO()
-            img.save(img_bytes, format='PNG')
-            img_bytes.seek(0)
-            
-            files = {'file': ('test_bill.png', img_bytes, 'image/png')}
+            files = {'file': ('test_bill.png', sample_bill_png(), 'image/png')}
             
             success, response = self.run_test(
                 "Bill Upload",
                 "POST",
                 "bills/upload",
                 200,
-                files=files
+                files=files,
+                timeout=UPLOAD_TIMEOUT
             )
             
             if success:
-                print(f"   Bill ID: {response.get('bill', {}).get('id', 'N/A')}")
-                print(f"   Items found: {len(response.get('items_with_prices', []))}")
-                print(f"   Total amount: ₹{response.get('bill', {}).get('total_amount', 0)}")
-                print(f"   Savings potential: ₹{response.get('total_savings_potential', 0)}")
+                self.say(f"   Bill ID: {response.get('bill', {}).get('id', 'N/A')}")
+                self.say(f"   Items found: {len(response.get('items_with_prices', []))}")
+                self.say(f"   Total amount: ₹{response.get('bill', {}).get('total_amount', 0)}")
+                self.say(f"   Savings potential: ₹{response.get('total_savings_potential', 0)}")
             
             return success
             
@@ -182,7 +328,7 @@ class SmartSpendAPITester:
         )
         
         if success:
-            print(f"   Bills found: {len(response)}")
+            self.say(f"   Bills found: {len(response)}")
         
         return success
 
@@ -196,9 +342,9 @@ class SmartSpendAPITester:
         )
         
         if success:
-            print(f"   Total spending: ₹{response.get('total_spending', 0)}")
-            print(f"   Categories: {len(response.get('category_breakdown', {}))}")
-            print(f"   Monthly trend points: {len(response.get('monthly_trend', []))}")
+            self.say(f"   Total spending: ₹{response.get('total_spending', 0)}")
+            self.say(f"   Categories: {len(response.get('category_breakdown', {}))}")
+            self.say(f"   Monthly trend points: {len(response.get('monthly_trend', []))}")
         
         return success
 
@@ -213,9 +359,9 @@ class SmartSpendAPITester:
         )
         
         if success:
-            print(f"   Budget: ₹{response.get('budget', 0)}")
-            print(f"   Items: {len(response.get('items', []))}")
-            print(f"   Total estimated: ₹{response.get('total_estimated', 0)}")
+            self.say(f"   Budget: ₹{response.get('budget', 0)}")
+            self.say(f"   Items: {len(response.get('items', []))}")
+            self.say(f"   Total estimated: ₹{response.get('total_estimated', 0)}")
         
         return success
 
@@ -229,45 +375,61 @@ class SmartSpendAPITester:
         )
         
         if success:
-            print(f"   Saved lists: {len(response)}")
+            self.say(f"   Saved lists: {len(response)}")
         
         return success
 
+    def run_independent_tests(self):
+        """Run the tests that only need a token concurrently on the shared client"""
+        tests = [
+            self.test_get_current_user,
+            self.test_bill_upload,
+            self.test_get_bills,
+            self.test_get_insights,
+            self.test_get_shopping_lists,
+        ]
+        # The client's connection pool is thread-safe; the pool size bounds concurrency
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_TESTS, thread_name_prefix='api-test') as executor:
+            return list(executor.map(self.run_buffered, tests))
+
     def run_all_tests(self):
         """Run all API tests"""
-        print("🚀 Starting Smart Shopping Assistant API Tests")
-        print(f"   Base URL: {self.base_url}")
-        print("=" * 60)
+        self.say("🚀 Starting Smart Shopping Assistant API Tests")
+        self.say(f"   Base URL: {self.base_url}")
+        self.say("=" * 60)
         
-        # Test authentication flow
-        if not self.test_user_registration():
-            print("\n⚠️  Registration failed, trying login...")
-            if not self.test_user_login():
-                print("❌ Both registration and login failed. Stopping tests.")
-                return False
+        # Test authentication flow (skipped when a cached token is still accepted)
+        if not self.load_cached_token():
+            if not self.test_user_registration():
+                self.say("\n⚠️  Registration failed, trying login...")
+                if not self.test_user_login():
+                    self.say("❌ Both registration and login failed. Stopping tests.")
+                    return False
+            self.save_token()
         
-        # Test protected endpoints
-        self.test_get_current_user()
-        self.test_bill_upload()
-        self.test_get_bills()
-        self.test_get_insights()
+        # Test protected endpoints (independent ones overlap their round trips)
+        self.run_independent_tests()
         self.test_generate_shopping_list()
-        self.test_get_shopping_lists()
         
         # Print summary
-        print("\n" + "=" * 60)
-        print(f"📊 Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
+        self.say("\n" + "=" * 60)
+        self.say(f"📊 Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
         
         if self.tests_passed == self.tests_run:
-            print("🎉 All tests passed!")
+            self.say("🎉 All tests passed!")
             return True
         else:
-            print(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
+            self.say(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
             return False
 
 def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s', handlers=[logging.StreamHandler()])
+    logging.getLogger('httpx').setLevel(logging.WARNING)  # no per-request lines from httpx
     tester = SmartSpendAPITester()
-    success = tester.run_all_tests()
+    try:
+        success = tester.run_all_tests()
+    finally:
+        tester.client.close()
     
     # Save detailed results
     results = {
@@ -278,8 +440,9 @@ def main():
         "test_details": tester.test_results
     }
     
-    with open('/app/backend_test_results.json', 'w') as f:
-        json.dump(results, f, indent=2)
+    # Encoded to UTF-8 bytes in one pass and written with a single call
+    with open('/app/backend_test_results.json', 'wb') as f:
+        f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
     
     return 0 if success else 1
 
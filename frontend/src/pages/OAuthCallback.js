@@ -1,5 +1,6 @@
 import { useEffect, useState } from 'react';
 import { useNavigate, useSearchParams } from 'react-router-dom';
+import axios from 'axios';
 import { Loader2 } from 'lucide-react';
 
 const OAuthCallback = ({ onLogin }) => {
@@ -9,7 +10,6 @@ const OAuthCallback = ({ onLogin }) => {
 
     useEffect(() => {
         const token = searchParams.get('token');
-        const userJson = searchParams.get('user');
         const errorParam = searchParams.get('error');
 
         if (errorParam) {
@@ -20,18 +20,19 @@ const OAuthCallback = ({ onLogin }) => {
             return;
         }
 
-        if (token && userJson) {
-            try {
-                const user = JSON.parse(userJson);
-                onLogin(token, user);
-                navigate('/dashboard');
-            } catch (err) {
-                console.error('Failed to parse user data:', err);
-                setError('Failed to process authentication data.');
-                setTimeout(() => {
-                    navigate('/login');
-                }, 2000);
-            }
+        if (token) {
+            axios.get('/auth/me', { headers: { Authorization: `Bearer ${token}` } })
+                .then((response) => {
+                    onLogin(token, response.data);
+                    navigate('/dashboard');
+                })
+                .catch((err) => {
+                    console.error('Failed to load user data:', err);
+                    setError('Failed to process authentication data.');
+                    setTimeout(() => {
+                        navigate('/login');
+                    }, 2000);
+                });
         } else {
             setError('Missing authentication data.');
             setTimeout(() => {